@@ -1,21 +1,31 @@
 # -*- coding: utf-8 -*-
 # Türkei-Feed: nur frische Artikel, robuste Datumsprüfung, Timeout & Logging
 
-import socket, re, hashlib
-from typing import Optional, Dict, Any, List
+import re, json, heapq, asyncio, hashlib
+from functools import lru_cache
+from operator import attrgetter
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple
 import feedparser
-from feedgen.feed import FeedGenerator
+import httpx
+try:  # RE2: lineare Laufzeit, kein Backtracking (optional)
+    import re2 as _re
+except ImportError:
+    _re = re
+from xml.sax.saxutils import escape, quoteattr
 from datetime import datetime, timezone, timedelta
-from dateutil import parser as dtp
+from email.utils import parsedate_to_datetime, format_datetime
 
 # ---- Einstellungen (anpassbar) ----
 MAX_AGE_DAYS = 14          # nur Einträge der letzten X Tage
 MAX_ITEMS = 150            # maximal so viele Items im RSS
 HTTP_TIMEOUT = 10          # Sek. Timeout pro Feed
+MAX_CONNECTIONS = 20       # gleichzeitige Verbindungen
+CACHE_FILE = "turkey_cache.json"  # ETag/Last-Modified + Treffer je Feed
+SEEN_FILE = "turkey_seen.json"    # Filter-Entscheidungen je Eintrag, über Läufe hinweg
+SEEN_MAX = 10_000                 # so viele zuletzt gesehene Einträge merken
 USER_AGENT = {"User-Agent": "turkey-feed/1.0 (+https://example.local)"}
-
-# Netz-Timeout global setzen
-socket.setdefaulttimeout(HTTP_TIMEOUT)
+FEED_URL = "https://mickymoses.github.io/turkeyfeed/turkey.xml"
+OUT_FILE = "turkey.xml"
 
 # Quellen
 FEEDS = [
@@ -45,43 +55,78 @@ FEEDS = [
 ]
 
 # --- Türkei-Erkennung ---
-COUNTRY_PAT = re.compile(r"\b(türkei|turkei|türkiye|turkey)\b", re.IGNORECASE)
-TURKISH_ADJ_PAT = re.compile(
-    r"\b("
+COUNTRY_SRC = r"türkei|turkei|türkiye|turkey"
+TURKISH_ADJ_SRC = (
     r"türkisch(?:e[rsnm]?|en|er)?|tuerkisch(?:e[rsnm]?|en|er)?|"
     r"türke|tuerke|türkin|tuerkin"
-    r")\b",
-    re.IGNORECASE,
 )
-GAZETTEER = {
+GAZETTEER = frozenset({
     "istanbul","ankara","izmir","bursa","antalya","adana","konya","gaziantep","kayseri","mersin",
     "eskisehir","eskişehir","diyarbakir","diyarbakır","sanliurfa","şanlıurfa","trabzon","van",
     "erzurum","malatya","manisa","balikesir","balıkesir","denizli","tekirdag","tekirdağ","sivas",
     "hatay","mardin","batman","sirnak","şırnak","bodrum","marmaris","cesme","çeşme","alanya",
     "fethiye","kapadokya","kappadokien","cappadocia"
-}
+})
+# Wortgrenzen: RE2 kennt \b nur für ASCII, daher dort über Unicode-Klassen
+if _re is re:
+    _B_START, _B_END = r"\b", r"\b"
+else:
+    _B_START, _B_END = r"(?:^|[^\p{L}\p{N}_])", r"(?:[^\p{L}\p{N}_]|$)"
+# Adjektive, Ländername und Orte in einer Alternation -> ein Durchlauf pro Text;
+# ohne (?i), looks_like_turkey schreibt den Text bereits klein
+TURKEY_PAT = _re.compile(
+    _B_START + r"(?:"
+    + TURKISH_ADJ_SRC + r"|"
+    + COUNTRY_SRC + r"|"
+    + "|".join(re.escape(k) for k in sorted(GAZETTEER, key=len, reverse=True))
+    + r")" + _B_END
+)
 DOMAIN_HINTS = (".tr/", "//tr.", ".tr?")
+# Fingerabdruck der Filterregeln (inkl. Altersgrenze): ändern sie sich,
+# sind gespeicherte Entscheidungen und gecachte Treffer ungültig
+FILTER_FP = hashlib.sha256(
+    "\x00".join((TURKEY_PAT.pattern, *DOMAIN_HINTS, str(MAX_AGE_DAYS))).encode("utf-8")
+).hexdigest()[:16]
+
+def _make_matcher():
+    # Regex-Methode und Hinweise als lokale Namen binden (spart Global-/Attribut-Lookups)
+    search = TURKEY_PAT.search
+    hints = DOMAIN_HINTS
 
-def looks_like_turkey(title: str, summary: str, link: str) -> bool:
-    text = f" {title} {summary} ".lower()
-    if TURKISH_ADJ_PAT.search(text):  # dein "immer nehmen"
-        return True
-    if COUNTRY_PAT.search(text):
-        return True
-    if any(f" {k} " in f" {text} " for k in GAZETTEER):
-        return True
-    if any(h in link.lower() for h in DOMAIN_HINTS):
-        return True
-    return False
+    def looks_like_turkey(title: str, summary: str, link: str) -> bool:
+        # billigster Test zuerst: .tr-Domain im Link, ohne Textarbeit
+        ll = link.lower()
+        if any(h in ll for h in hints):
+            return True
+        text = f"{title} {summary}".lower()  # einmal kleinschreiben
+        return search(text) is not None
+
+    return looks_like_turkey
+
+looks_like_turkey = _make_matcher()
 
 # --- Datumshandling ---
-def parse_date_from_entry(e: Dict[str, Any]) -> Optional[datetime]:
+@lru_cache(maxsize=4096)
+def _parse_dt_str(s: str, max_year: int) -> Optional[datetime]:
+    """Rohes Datum (RFC 822 / ISO 8601) -> UTC-datetime oder None, gecacht."""
+    try:
+        try:
+            dt = parsedate_to_datetime(s)
+        except (TypeError, ValueError):
+            dt = datetime.fromisoformat(s)
+        if not dt.tzinfo:
+            dt = dt.replace(tzinfo=timezone.utc)
+        if 2000 <= dt.year <= max_year:
+            return dt
+    except Exception:
+        pass
+    return None
+
+def parse_date_from_entry(e: Dict[str, Any], max_year: int) -> Optional[datetime]:
     """
     Liefert UTC-datetime oder None.
-    Filtert unplausible Jahre raus (z.B. 20024).
+    Filtert unplausible Jahre raus (z.B. 20024), max_year kommt vom Aufrufer.
     """
-    now = datetime.now(timezone.utc)
-    max_year = now.year + 1  # etwas Toleranz
     # 1) strukturierte Felder von feedparser nutzen
     for key in ("published_parsed", "updated_parsed"):
         st = e.get(key)
@@ -92,99 +137,254 @@ def parse_date_from_entry(e: Dict[str, Any]) -> Optional[datetime]:
                     return dt
             except Exception:
                 pass
-    # 2) Textfelder
+    # 2) Textfelder: RFC 822 (RSS), sonst ISO 8601 (Atom)
     for key in ("published", "updated"):
         s = e.get(key)
         if not s:
             continue
-        try:
-            dt = dtp.parse(s)
-            if not dt.tzinfo:
-                dt = dt.replace(tzinfo=timezone.utc)
-            if 2000 <= dt.year <= max_year:
-                return dt
-        except Exception:
-            continue
+        dt = _parse_dt_str(s, max_year)
+        if dt:
+            return dt
     return None
 
-def is_recent(dt: Optional[datetime]) -> bool:
+def is_recent(dt: Optional[datetime], cutoff: datetime) -> bool:
     if not dt:
         return False
-    return (datetime.now(timezone.utc) - dt) <= timedelta(days=MAX_AGE_DAYS)
+    return dt >= cutoff
 
 def log(msg: str) -> None:
     print(msg, flush=True)
 
-def build_feed() -> None:
-    fg = FeedGenerator()
-    fg.id("https://mickymoses.github.io/turkeyfeed/turkey.xml")
-    fg.title("Türkei – gefilterte Meldungen (nur aktuell)")
-    fg.link(href="https://mickymoses.github.io/turkeyfeed/turkey.xml", rel="self")
-    fg.description(f"Automatisch gefilterte Meldungen mit Türkei-Bezug. Nur die letzten {MAX_AGE_DAYS} Tage.")
-    fg.language("de")
-
-    seen: set[str] = set()
-    items: List[Dict[str, Any]] = []
-
-    for url in FEEDS:
-        log(f"→ Hole: {url}")
-        try:
-            feed = feedparser.parse(url, request_headers=USER_AGENT)
-        except Exception as ex:
-            log(f"   ⚠️ Abruffehler: {ex}")
+# --- Treffer ---
+class Item(NamedTuple):
+    title: str
+    link: str
+    summary: str
+    source: str
+    published: Optional[datetime]
+
+# --- Caches zwischen den Läufen ---
+# CACHE_FILE: ETag/Last-Modified für Conditional GET, je Feed mit FILTER_FP
+# SEEN_FILE:  {"filter": FILTER_FP, "entries": {"titel\x00link" -> Item oder None}}
+def load_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_json(path: str, data: Dict[str, Any]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+def item_to_json(it: Item) -> Dict[str, Any]:
+    pub = it.published
+    return {**it._asdict(), "published": pub.isoformat() if pub else None}
+
+def item_from_json(d: Dict[str, Any]) -> Item:
+    pub = d.get("published")
+    return Item(**{**d, "published": datetime.fromisoformat(pub) if pub else None})
+
+async def fetch_one(
+    client: httpx.AsyncClient, url: str, cached: Dict[str, Any]
+) -> Optional[httpx.Response]:
+    """Lädt einen Feed (Conditional GET); None bei Abruffehler."""
+    log(f"→ Hole: {url}")
+    headers = {}
+    # gecachte Treffer nur wiederverwenden, wenn sie mit den aktuellen Filterregeln entstanden
+    if cached.get("filter") == FILTER_FP:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"):
+            headers["If-Modified-Since"] = cached["modified"]
+    try:
+        r = await client.get(url, headers=headers)
+        if r.status_code != 304:
+            r.raise_for_status()
+        return r
+    except Exception as ex:
+        log(f"   ⚠️ Abruffehler ({url}): {ex}")
+        return None
+
+async def fetch_all(cache: Dict[str, Dict[str, Any]]) -> List[Optional[httpx.Response]]:
+    """Alle Feeds gleichzeitig in einer Event-Loop über einen Verbindungspool."""
+    async with httpx.AsyncClient(
+        http2=True,
+        headers=USER_AGENT,
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS),
+    ) as client:
+        return await asyncio.gather(*(fetch_one(client, u, cache.get(u, {})) for u in FEEDS))
+
+def process_feed(
+    url: str,
+    r: Optional[httpx.Response],
+    cached: Dict[str, Any],
+    known: Dict[str, Optional[Dict[str, Any]]],
+    cutoff: datetime,
+    max_year: int,
+) -> Tuple[str, List[Item], Dict[str, Any], Dict[str, Optional[Dict[str, Any]]]]:
+    """
+    Parst eine Antwort und liefert (Quelle, Kandidaten, neuer Cache-Eintrag,
+    Entscheidungen je Eintrag). Bereits bekannte Einträge (known) werden
+    nicht neu geprüft, known selbst bleibt unverändert.
+    """
+    if r is None:
+        return url, [], cached, {}
+
+    # 304: unverändert -> Treffer aus dem Cache, nur Alter neu prüfen
+    if r.status_code == 304:
+        found = [item_from_json(d) for d in cached.get("items", [])]
+        found = [it for it in found if is_recent(it.published, cutoff)]
+        return cached.get("source", url), found, cached, {}
+
+    # finale URL als Basis, damit relative Links absolut werden
+    feed = feedparser.parse(
+        r.content, response_headers={**r.headers, "content-location": str(r.url)}
+    )
+    # feedparser setzt bozo/feed/entries immer; bozo_exception nur bei bozo
+    try:
+        if feed.bozo:
+            log(f"   ⚠️ Warnung (bozo, {url}): {feed.bozo_exception}")
+        source = feed.feed.get("title", url) if feed.feed else url
+        entries = feed.entries
+    except AttributeError as ex:
+        log(f"   ⚠️ Parserfehler ({url}): {ex}")
+        return url, [], cached, {}
+
+    found: List[Item] = []
+    decided: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    for e in entries:
+        title = e.get("title") or ""
+        summary = e.get("summary") or e.get("subtitle", "") or ""
+        link = e.get("link") or ""
+        if not title and not summary:
             continue
 
-        if getattr(feed, "bozo", 0):
-            log(f"   ⚠️ Warnung (bozo): {getattr(feed, 'bozo_exception', '')}")
+        # schon in einem früheren Lauf entschieden -> nur Alter neu prüfen
+        key = f"{title}\x00{link}"
+        if key in known:
+            decided[key] = d = known[key]
+            if d is not None:
+                # Quelle immer vom aktuellen Feed, der Schlüssel gilt feedübergreifend
+                it = item_from_json(d)._replace(source=source)
+                if is_recent(it.published, cutoff):
+                    found.append(it)
+            continue
 
-        source = getattr(feed, "feed", {}).get("title", url)
-        start_count = len(items)
+        # Alter zuerst prüfen (meist nur Tupel lesen), Regex nur für frische Einträge;
+        # zu alte Einträge nicht merken, das hängt an MAX_AGE_DAYS und dem Lauf
+        pub = parse_date_from_entry(e, max_year)
+        if not is_recent(pub, cutoff):
+            continue  # zu alt oder kein valides Datum
+        decided[key] = None
+        if not looks_like_turkey(title, summary, link):
+            continue
 
-        for e in getattr(feed, "entries", []):
-            title = e.get("title") or ""
-            summary = e.get("summary") or e.get("subtitle", "") or ""
-            link = e.get("link") or ""
-            if not title and not summary:
-                continue
-            if not looks_like_turkey(title, summary, link):
-                continue
+        it = Item(title, link, summary, source, pub)
+        found.append(it)
+        decided[key] = item_to_json(it)
 
-            pub = parse_date_from_entry(e)
-            if not is_recent(pub):
-                continue  # zu alt oder kein valides Datum
+    entry = {
+        "etag": r.headers.get("etag"),
+        "modified": r.headers.get("last-modified"),
+        "source": source,
+        "filter": FILTER_FP,
+        "items": [item_to_json(it) for it in found],
+    }
+    return source, found, entry, decided
 
-            h = hashlib.sha256((title + link).encode("utf-8")).hexdigest()
-            if h in seen:
-                continue
-            seen.add(h)
+# --- RSS-Ausgabe ---
+# in XML 1.0 unzulässige Steuerzeichen
+XML_INVALID_PAT = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
 
-            items.append({
-                "title": title, "link": link, "summary": summary,
-                "source": source, "published": pub
-            })
+def xml_text(s: str) -> str:
+    return escape(XML_INVALID_PAT.sub("", s))
 
-        log(f"   ✓ {len(items) - start_count} frische Treffer")
+def write_rss(items: List[Item], now: datetime) -> None:
+    """Schreibt RSS 2.0 direkt als Text, ohne DOM."""
+    out = [
+        "<?xml version='1.0' encoding='UTF-8'?>",
+        '<rss xmlns:atom="http://www.w3.org/2005/Atom" version="2.0">',
+        "  <channel>",
+        "    <title>Türkei – gefilterte Meldungen (nur aktuell)</title>",
+        f"    <link>{escape(FEED_URL)}</link>",
+        "    <description>Automatisch gefilterte Meldungen mit Türkei-Bezug. "
+        f"Nur die letzten {MAX_AGE_DAYS} Tage.</description>",
+        f"    <atom:link href={quoteattr(FEED_URL)} rel=\"self\"/>",
+        "    <language>de</language>",
+        f"    <lastBuildDate>{format_datetime(now)}</lastBuildDate>",
+    ]
+    for it in items:
+        desc = (it.summary or "").strip()
+        if it.source:
+            desc = f"{it.source}: {desc}"
+        out.append("    <item>")
+        out.append(f"      <title>{xml_text(it.title)}</title>")
+        out.append(f"      <link>{xml_text(it.link)}</link>")
+        out.append(f"      <description>{xml_text(desc)}</description>")
+        out.append(f"      <guid isPermaLink=\"false\">{xml_text(it.link)}</guid>")
+        if it.published:
+            out.append(f"      <pubDate>{format_datetime(it.published)}</pubDate>")
+        out.append("    </item>")
+    out.append("  </channel>")
+    out.append("</rss>")
+
+    with open(OUT_FILE, "w", encoding="utf-8") as f:
+        f.write("\n".join(out) + "\n")
 
-    # sortieren (neueste zuerst) und begrenzen
-    items.sort(key=lambda x: x["published"] or datetime.min.replace(tzinfo=timezone.utc), 
-reverse=True)
-    items = items[:MAX_ITEMS]
+def build_feed() -> None:
+    seen: set[Tuple[str, str]] = set()
+    items: List[Item] = []
+    cache = load_json(CACHE_FILE)
+    seen_data = load_json(SEEN_FILE)
+    # mit anderen Filterregeln getroffene Entscheidungen verwerfen
+    known = seen_data.get("entries", {}) if seen_data.get("filter") == FILTER_FP else {}
+
+    # Zeitbezug einmal pro Lauf
+    now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=MAX_AGE_DAYS)
+    max_year = now.year + 1  # etwas Toleranz
+    new_cache: Dict[str, Dict[str, Any]] = {}
+
+    # gleichzeitig abrufen, danach seriell parsen und zusammenführen
+    responses = asyncio.run(fetch_all(cache))
+    decisions: List[Dict[str, Optional[Dict[str, Any]]]] = []
+    for url, r in zip(FEEDS, responses):
+        source, found, new_cache[url], decided = process_feed(
+            url, r, cache.get(url, {}), known, cutoff, max_year
+        )
+        decisions.append(decided)
+        start_count = len(items)
+
+        for it in found:
+            key = (it.title, it.link)
+            if key in seen:
+                continue
+            seen.add(key)
+            items.append(it)
+
+        log(f"   ✓ {source}: {len(items) - start_count} frische Treffer")
+
+    # sortieren (neueste zuerst) und begrenzen;
+    # published ist nie None, is_recent lässt nur datierte Einträge durch
+    items = heapq.nlargest(MAX_ITEMS, items, key=attrgetter("published"))
 
     # in RSS schreiben
-    for it in items:
-        fe = fg.add_entry()
-        fe.id(it["link"])
-        fe.title(it["title"])
-        desc = (it["summary"] or "").strip()
-        if it["source"]:
-            desc = f"{it['source']}: {desc}"
-        fe.description(desc)
-        fe.link(href=it["link"])
-        if it["published"]:
-            fe.published(it["published"])
-
-    fg.rss_file("turkey.xml", pretty=True)
-    log(f"✅ RSS geschrieben: turkey.xml (Items: {len(items)})")
+    write_rss(items, now)
+    save_json(CACHE_FILE, new_cache)
+
+    # Entscheidungen ans Ende schieben (zuletzt gesehen) und auf SEEN_MAX kürzen
+    for decided in decisions:
+        for key, d in decided.items():
+            known.pop(key, None)
+            known[key] = d
+    if len(known) > SEEN_MAX:
+        known = dict(list(known.items())[-SEEN_MAX:])
+    save_json(SEEN_FILE, {"filter": FILTER_FP, "entries": known})
+    log(f"✅ RSS geschrieben: {OUT_FILE} (Items: {len(items)})")
 
 if __name__ == "__main__":
     build_feed()